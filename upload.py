@@ -13,13 +13,18 @@ that divide the content into chapters.
 
 import argparse
 import os
-import re
+import queue
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-from bs4 import BeautifulSoup
+import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -31,47 +36,148 @@ from selenium.common.exceptions import TimeoutException
 # Parsing
 # ---------------------------------------------------------------------------
 
-def parse_chapters(html_path: Path) -> list[dict]:
+# NovelCrafter chapter headings; lexbor normalizes tag names to lowercase
+_H12_SELECTOR = "h1, h2"
+_H12_NAMES = frozenset(("h1", "h2"))
+
+
+@dataclass(slots=True)
+class Chapter:
+    """One chapter split out of the export: heading text plus inner HTML."""
+    title: str
+    content: str
+    # First ~100 characters of body text, for human-readable listings
+    preview: str = ""
+
+
+def _content_until_heading(start, limit: int | None = None) -> str:
     """
-    Parse a NovelCrafter HTML export and split it into chapters.
-    
-    Each chapter dict contains:
-        - title: str (the heading text)
-        - content: str (the inner HTML of that chapter's body)
+    Serialize the sibling run from `start` up to the next h1/h2 (or end).
+
+    Each sibling (tags and text nodes alike) is serialized exactly once by
+    lexbor and joined in a single pass, so the chapter body comes out
+    byte-for-byte as it appears in the export. If `limit` is given, stop
+    once at least that many characters are collected and leave the rest of
+    the run unserialized.
     """
-    with open(html_path, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f, "lxml")
+    parts = []
+    # Bind loop invariants to locals; these lookups run once per sibling
+    append = parts.append
+    headings = _H12_NAMES
+    sibling = start
+    size = 0
+    while sibling is not None and sibling.tag not in headings:
+        if limit is not None and size >= limit:
+            break
+        html = sibling.html or ""
+        append(html)
+        size += len(html)
+        sibling = sibling.next
+    return "".join(parts)
+
+
+def _first_text(start) -> str:
+    """Return the first non-empty stripped text among `start` and its siblings."""
+    node = start
+    while node is not None and node.tag not in _H12_NAMES:
+        text = node.text(strip=True)
+        if text:
+            return text[:100]
+        node = node.next
+    return ""
+
+
+def iter_chapters(html_path: Path, preview_only: bool = False):
+    """
+    Parse a NovelCrafter HTML export and yield chapters one at a time.
 
-    chapters: list[dict] = []
-    
-    # NovelCrafter typically uses h1 or h2 for chapter titles
-    # We'll look for heading elements and collect content until the next heading
-    headings = soup.find_all(re.compile(r"^h[12]$", re.I))
-    
-    if not headings:
-        # Fallback: treat entire document as one chapter
-        body = soup.find("body") or soup
-        return [{
-            "title": "Chapter 1",
-            "content": "".join(str(child) for child in body.children)
-        }]
-    
-    for i, heading in enumerate(headings):
-        title = heading.get_text(strip=True)
-        
-        # Collect all siblings until the next heading (or end)
-        content_parts = []
-        for sibling in heading.find_next_siblings():
-            if sibling.name and re.match(r"^h[12]$", sibling.name, re.I):
-                break
-            content_parts.append(str(sibling))
-        
-        chapters.append({
-            "title": title,
-            "content": "\n".join(content_parts)
-        })
-    
-    return chapters
+    Chapters are yielded as their headings are encountered, so callers can
+    start uploading before the rest of the export has been serialized.
+    With preview_only, chapter content is not serialized at all; only the
+    title and the text preview are captured -- all --list-chapters needs.
+    """
+    limit = 0 if preview_only else None
+    # Read raw bytes; lexbor decodes them itself, so there's no point
+    # paying for a Python-side UTF-8 decode first
+    with open(html_path, "rb") as f:
+        tree = LexborHTMLParser(f.read())
+
+    # Chapter markup only ever lives inside <body>; walking its children
+    # keeps head/meta/script/style nodes out of the traversal entirely
+    body = tree.body or tree.root
+
+    # Cheap C-side probe for the first heading; exports with none (a
+    # single untitled chapter) skip the Python walk entirely
+    first = body.css_first(_H12_SELECTOR)
+    if first is None:
+        yield Chapter(
+            "Chapter 1",
+            _content_until_heading(body.child, limit),
+            _first_text(body.child),
+        )
+        return
+
+    # NovelCrafter emits chapter headings (h1/h2) as direct children of
+    # <body>, so a single walk over the sibling chain from the first
+    # heading both finds the headings and collects each chapter's content
+    title = None
+    preview = ""
+    parts: list[str] = []
+    size = 0
+    node = first
+    while node is not None:
+        if node.tag in _H12_NAMES:
+            if title is not None:
+                yield Chapter(title, "".join(parts), preview)
+            title = node.text(strip=True)
+            preview = ""
+            parts = []
+            size = 0
+        else:
+            if not preview:
+                preview = node.text(strip=True)[:100]
+            if limit is None or size < limit:
+                html = node.html or ""
+                parts.append(html)
+                size += len(html)
+        node = node.next
+
+    yield Chapter(title, "".join(parts), preview)
+
+
+def parse_chapters(html_path: Path, preview_only: bool = False) -> list[Chapter]:
+    """Parse a NovelCrafter HTML export into a list of chapters."""
+    return list(iter_chapters(html_path, preview_only))
+
+
+def pipeline_chapters(html_path: Path):
+    """
+    Yield chapters parsed on a background thread.
+
+    A producer thread runs iter_chapters and feeds a small bounded queue,
+    so parsing and serialization overlap with the uploads that consume
+    this generator instead of stalling the first POST.
+    """
+    chapter_queue: queue.Queue = queue.Queue(maxsize=4)
+    done = object()
+
+    def produce():
+        try:
+            for chapter in iter_chapters(html_path):
+                chapter_queue.put(chapter)
+            chapter_queue.put(done)
+        except BaseException as exc:  # re-raised on the consuming side
+            chapter_queue.put(exc)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while True:
+        item = chapter_queue.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
 
 # ---------------------------------------------------------------------------
@@ -83,8 +189,27 @@ def create_driver(headless: bool = False) -> webdriver.Chrome:
     options = webdriver.ChromeOptions()
     if headless:
         options.add_argument("--headless=new")
+        # Persist cookies across runs so a prior AO3 login can be reused.
+        # Headless only: the non-headless flow detaches and leaves the
+        # browser open, which would hold the profile lock and break the
+        # next invocation
+        options.add_argument(f"--user-data-dir={Path.home() / '.ao3_uploader_chrome'}")
     options.add_argument("--disable-gpu")
     options.add_argument("--window-size=1920,1080")
+    # AO3's pages are asset-heavy; skip images, extensions and background
+    # chatter since none of them matter for form filling
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--no-default-browser-check")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-features=Translate,BackForwardCache")
+    # Return from driver.get on DOMContentLoaded instead of the full load event
+    options.page_load_strategy = "eager"
     # Keep browser open after script ends for debugging
     options.add_experimental_option("detach", True)
     return webdriver.Chrome(options=options)
@@ -92,14 +217,14 @@ def create_driver(headless: bool = False) -> webdriver.Chrome:
 
 def wait_for(driver, by, value, timeout: int = 10):
     """Wait for an element to be present and return it."""
-    return WebDriverWait(driver, timeout).until(
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
         EC.presence_of_element_located((by, value))
     )
 
 
 def wait_clickable(driver, by, value, timeout: int = 10):
     """Wait for an element to be clickable and return it."""
-    return WebDriverWait(driver, timeout).until(
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
         EC.element_to_be_clickable((by, value))
     )
 
@@ -114,18 +239,44 @@ def safe_send_keys(driver, element, text: str):
         driver.execute_script("arguments[0].value = arguments[1];", element, text)
 
 
+def set_field_value(driver, element, text: str):
+    """
+    Set a field's value in one JavaScript call.
+
+    send_keys costs one WebDriver round-trip per character, which is far
+    too slow for chapter-sized text; this assigns the value directly and
+    fires an input event so the page reacts as if it were typed.
+    """
+    driver.execute_script(
+        "arguments[0].value = arguments[1];"
+        "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
+        element,
+        text,
+    )
+
+
 # ---------------------------------------------------------------------------
 # AO3 automation
 # ---------------------------------------------------------------------------
 
+# Minimum seconds between consecutive chapter posts (sustained rate toward AO3)
+PACING_INTERVAL = 1.5
+
+def is_logged_in(driver) -> bool:
+    """Check whether the persistent profile still has a live AO3 session."""
+    driver.get("https://archiveofourown.org/")
+    try:
+        wait_for(driver, By.CSS_SELECTOR, "ul.user.navigation", timeout=3)
+        return True
+    except TimeoutException:
+        return False
+
+
 def login(driver, username: str, password: str):
     """Log in to AO3."""
     print("Navigating to AO3 login page...")
     driver.get("https://archiveofourown.org/users/login")
-    
-    # Wait for page to fully load
-    time.sleep(2)
-    
+
     # Wait for the form to be present
     user_field = wait_for(driver, By.ID, "user_login", timeout=15)
     safe_send_keys(driver, user_field, username)
@@ -176,14 +327,12 @@ def upload_chapter(driver, work_id: str, title: str, content: str, dry_run: bool
     
     # Fill in chapter title
     title_field = driver.find_element(By.ID, "chapter_title")
-    title_field.clear()
-    title_field.send_keys(title)
-    
+    set_field_value(driver, title_field, title)
+
     # Fill in chapter content
     # AO3 uses a textarea; we inject HTML directly
     content_field = driver.find_element(By.ID, "chapter_content")
-    content_field.clear()
-    content_field.send_keys(content)
+    set_field_value(driver, content_field, content)
     
     if dry_run:
         print(f"  [DRY RUN] Would submit chapter: {title}")
@@ -201,35 +350,241 @@ def upload_chapter(driver, work_id: str, title: str, content: str, dry_run: bool
         print(f"  ✗ Failed to confirm post for: {title}")
 
 
+def upload_chapter_fast(driver, work_id: str, title: str, content: str, dry_run: bool = False) -> bool:
+    """
+    Upload a chapter by re-submitting the already-loaded new-chapter form.
+
+    Assumes navigate_to_add_chapter has been called once; the form fields
+    are reset and POSTed with an in-page fetch(), so no further page loads
+    are needed. Returns True if AO3 accepted the POST.
+    """
+    title_field = driver.find_element(By.ID, "chapter_title")
+    set_field_value(driver, title_field, title)
+
+    content_field = driver.find_element(By.ID, "chapter_content")
+    set_field_value(driver, content_field, content)
+
+    if dry_run:
+        print(f"  [DRY RUN] Would submit chapter: {title}")
+        return True
+
+    ok = driver.execute_async_script(
+        "var done = arguments[arguments.length - 1];"
+        "var form = document.getElementById('new_chapter');"
+        "fetch(form.action, {method: 'POST', body: new FormData(form)})"
+        # Validation failures re-render the form with a 2xx; a real post
+        # redirects to the new chapter's view page, same as _post_chapter
+        "    .then(function (resp) { done(resp.ok && resp.url.indexOf('/chapters/') !== -1); })"
+        "    .catch(function () { done(false); });"
+    )
+    if ok:
+        print(f"  ✓ Posted: {title}")
+    else:
+        print(f"  ✗ Failed to confirm post for: {title}")
+    return bool(ok)
+
+
 def upload_all_chapters(
     driver,
     work_id: str,
-    chapters: list[dict],
+    chapters,
     start_index: int = 0,
     dry_run: bool = False,
-):
+) -> int:
     """
     Upload multiple chapters to an AO3 work.
-    
+
     Args:
         driver: Selenium WebDriver
         work_id: The numeric ID of the AO3 work
-        chapters: List of chapter dicts with 'title' and 'content'
+        chapters: Iterable of Chapter objects
         start_index: Skip chapters before this index (0-based)
         dry_run: If True, fill forms but don't submit
+
+    Returns:
+        The number of chapters uploaded.
     """
-    total = len(chapters)
+    uploaded = 0
+    last_duration = 0.0
     for i, chapter in enumerate(chapters):
         if i < start_index:
-            print(f"Skipping chapter {i+1}/{total}: {chapter['title']}")
+            print(f"Skipping chapter {i+1}: {chapter.title}")
             continue
-        
-        print(f"Uploading chapter {i+1}/{total}: {chapter['title']}")
-        upload_chapter(driver, work_id, chapter["title"], chapter["content"], dry_run)
-        
-        # Be polite to AO3's servers
-        if not dry_run and i < total - 1:
-            time.sleep(3)
+
+        # Be polite to AO3's servers, counting time the last post already took
+        if uploaded and not dry_run:
+            time.sleep(max(0.0, PACING_INTERVAL - last_duration))
+
+        if uploaded == 0:
+            # Load the form once; every chapter after that reuses it
+            navigate_to_add_chapter(driver, work_id)
+
+        print(f"Uploading chapter {i+1}: {chapter.title}")
+        started = time.monotonic()
+        upload_chapter_fast(driver, work_id, chapter.title, chapter.content, dry_run)
+        last_duration = time.monotonic() - started
+        uploaded += 1
+
+    return uploaded
+
+
+# ---------------------------------------------------------------------------
+# Direct HTTP upload (default path)
+# ---------------------------------------------------------------------------
+
+AO3_BASE = "https://archiveofourown.org"
+
+
+def create_session() -> requests.Session:
+    """Create a pooled requests Session for talking to AO3 directly."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "ao3-uploader (https://github.com/niuk/ao3-uploader)"
+    return session
+
+
+def _authenticity_token(html: str) -> str:
+    """Extract the Rails CSRF token from a rendered AO3 form page."""
+    field = LexborHTMLParser(html).css_first("input[name='authenticity_token']")
+    if field is None:
+        raise RuntimeError("Could not find authenticity_token in page")
+    return field.attributes["value"]
+
+
+def login_http(session: requests.Session, username: str, password: str):
+    """Log in to AO3 without a browser."""
+    print("Logging in to AO3...")
+    resp = session.get(f"{AO3_BASE}/users/login")
+    resp.raise_for_status()
+
+    resp = session.post(
+        f"{AO3_BASE}/users/login",
+        data={
+            "user[login]": username,
+            "user[password]": password,
+            "authenticity_token": _authenticity_token(resp.text),
+            "commit": "Log In",
+        },
+    )
+    resp.raise_for_status()
+
+    # Same markers the browser path checks for
+    if LexborHTMLParser(resp.text).css_first("ul.user.navigation") is None:
+        if "Invalid Username or password" in resp.text:
+            raise RuntimeError("Login failed: invalid credentials")
+        raise RuntimeError("Login failed: unexpected page state")
+    print("Login successful!")
+
+
+def _fetch_chapter_token(session: requests.Session, work_id: str) -> str:
+    """GET the new-chapter form and return its CSRF token."""
+    resp = session.get(f"{AO3_BASE}/works/{work_id}/chapters/new")
+    resp.raise_for_status()
+    return _authenticity_token(resp.text)
+
+
+def _post_chapter(
+    session: requests.Session,
+    work_id: str,
+    token: str,
+    title: str,
+    content: str,
+):
+    """POST one chapter and report whether AO3 confirmed it."""
+    data = {
+        "authenticity_token": token,
+        "chapter[title]": title,
+        "chapter[content]": content,
+        "commit": "Post",
+    }
+    resp = session.post(f"{AO3_BASE}/works/{work_id}/chapters", data=data)
+
+    if resp.status_code == 429:
+        # Rate limited; honor the server's requested back-off and retry once
+        try:
+            delay = float(resp.headers.get("Retry-After", ""))
+        except ValueError:
+            delay = 10.0
+        print(f"  Rate limited; retrying in {delay:.0f}s...")
+        time.sleep(delay)
+        resp = session.post(f"{AO3_BASE}/works/{work_id}/chapters", data=data)
+
+    # A successful post redirects to the new chapter's view page
+    if resp.ok and "/chapters/" in resp.url:
+        print(f"  ✓ Posted: {title}")
+    else:
+        print(f"  ✗ Failed to confirm post for: {title}")
+
+
+def upload_chapter_http(
+    session: requests.Session,
+    work_id: str,
+    title: str,
+    content: str,
+    dry_run: bool = False,
+):
+    """
+    Upload a single chapter over HTTP.
+
+    Mirrors upload_chapter, but costs two requests on a pooled connection
+    instead of a full browser page load: GET the new-chapter form for its
+    CSRF token, then POST the chapter fields.
+    """
+    token = _fetch_chapter_token(session, work_id)
+
+    if dry_run:
+        print(f"  [DRY RUN] Would submit chapter: {title}")
+        return
+
+    _post_chapter(session, work_id, token, title, content)
+
+
+def upload_all_chapters_http(
+    session: requests.Session,
+    work_id: str,
+    chapters,
+    start_index: int = 0,
+    dry_run: bool = False,
+) -> int:
+    """
+    Upload multiple chapters to an AO3 work over HTTP.
+
+    Same contract as upload_all_chapters, driven by a requests Session
+    instead of a WebDriver. Chapters are POSTed strictly in order (AO3
+    appends them in the order received), but each chapter's form GET runs
+    on a background worker so it overlaps the politeness delay instead of
+    adding latency of its own.
+    """
+    uploaded = 0
+    last_duration = 0.0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for i, chapter in enumerate(chapters):
+            if i < start_index:
+                print(f"Skipping chapter {i+1}: {chapter.title}")
+                continue
+
+            token_future = None
+            if not dry_run:
+                token_future = pool.submit(_fetch_chapter_token, session, work_id)
+
+            # Be polite to AO3's servers, counting time the last post
+            # already took; the token fetch above proceeds while we wait
+            if uploaded and not dry_run:
+                time.sleep(max(0.0, PACING_INTERVAL - last_duration))
+
+            print(f"Uploading chapter {i+1}: {chapter.title}")
+            if dry_run:
+                upload_chapter_http(session, work_id, chapter.title, chapter.content, dry_run)
+            else:
+                started = time.monotonic()
+                _post_chapter(
+                    session, work_id, token_future.result(), chapter.title, chapter.content
+                )
+                last_duration = time.monotonic() - started
+            uploaded += 1
+
+    return uploaded
 
 
 # ---------------------------------------------------------------------------
@@ -246,7 +601,8 @@ def main():
     parser.add_argument("--work-id", required=True, help="AO3 work ID to add chapters to")
     parser.add_argument("--start", type=int, default=0, help="Chapter index to start from (0-based)")
     parser.add_argument("--dry-run", action="store_true", help="Parse and fill forms, but don't submit")
-    parser.add_argument("--headless", action="store_true", help="Run browser in headless mode")
+    parser.add_argument("--use-browser", action="store_true", help="Upload through Selenium/Chrome instead of direct HTTP")
+    parser.add_argument("--headless", action="store_true", help="Run browser in headless mode (with --use-browser)")
     parser.add_argument("--list-chapters", action="store_true", help="Just list parsed chapters and exit")
     args = parser.parse_args()
     
@@ -255,15 +611,13 @@ def main():
         print(f"Error: file not found: {args.html_file}", file=sys.stderr)
         sys.exit(1)
     
-    # Parse chapters
-    print(f"Parsing {args.html_file}...")
-    chapters = parse_chapters(args.html_file)
-    print(f"Found {len(chapters)} chapter(s).")
-    
     if args.list_chapters:
+        print(f"Parsing {args.html_file}...")
+        chapters = parse_chapters(args.html_file, preview_only=True)
+        print(f"Found {len(chapters)} chapter(s).")
         for i, ch in enumerate(chapters):
-            preview = ch["content"][:80].replace("\n", " ") + "..."
-            print(f"  {i+1}. {ch['title']}: {preview}")
+            preview = ch.preview[:80].replace("\n", " ") + "..."
+            print(f"  {i+1}. {ch.title}: {preview}")
         sys.exit(0)
     
     # Credentials from environment
@@ -273,20 +627,39 @@ def main():
         print("Error: AO3_USERNAME and AO3_PASSWORD must be set in .env", file=sys.stderr)
         sys.exit(1)
     
-    # Launch browser and upload
-    driver = create_driver(headless=args.headless)
-    try:
-        login(driver, username, password)
-        upload_all_chapters(driver, args.work_id, chapters, args.start, args.dry_run)
-        print("Done!")
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
-    finally:
-        if args.headless:
-            driver.quit()
-        else:
-            print("Browser left open for inspection. Close it manually when done.")
+    if args.use_browser:
+        # Fallback path: drive a real browser
+        driver = create_driver(headless=args.headless)
+        try:
+            # The persistent profile often still holds a session cookie
+            if is_logged_in(driver):
+                print("Already logged in; skipping login.")
+            else:
+                login(driver, username, password)
+            uploaded = upload_all_chapters(
+                driver, args.work_id, pipeline_chapters(args.html_file), args.start, args.dry_run
+            )
+            print(f"Done! Uploaded {uploaded} chapter(s).")
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if args.headless:
+                driver.quit()
+            else:
+                print("Browser left open for inspection. Close it manually when done.")
+    else:
+        # Default path: talk to AO3 directly over a pooled session
+        session = create_session()
+        try:
+            login_http(session, username, password)
+            uploaded = upload_all_chapters_http(
+                session, args.work_id, pipeline_chapters(args.html_file), args.start, args.dry_run
+            )
+            print(f"Done! Uploaded {uploaded} chapter(s).")
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
 
 if __name__ == "__main__":